@@ -8,7 +8,7 @@ class DataStorage:
 
     def is_url_exist(self, url):
         try:
-            return True if self.client.crawler.documents.find({'url': url}).count() > 0 else False
+            return self.client.crawler.documents.find_one({'url': url}, {'_id': 1}) is not None
         except:
             return False
 
@@ -3,12 +3,20 @@ from urllib.parse import urlparse, urlunparse
 
 import re
 
+EMAIL_RE = re.compile(r'[\w\.-]+@[\w\.-]+')
+# the inline (?s) mid-pattern is an error on python 3.11; use the flag instead
+PGP_RE = re.compile(r'-----BEGIN PGP PUBLIC KEY BLOCK-----(.*)-----END PGP PUBLIC KEY BLOCK-----', re.S)
+BTC_RE = re.compile(r'[13][a-km-zA-HJ-NP-Z1-9]{25,34}')
+ETH_RE = re.compile(r'0x[a-fA-F0-9]{40}')
+XMR_RE = re.compile(r'4[0-9AB][1-9A-HJ-NP-Za-km-z]{93}')
+
 class Extractor:
 
     def __init__(self, base_url, html):
         self.html = html
         self.soup = BeautifulSoup(html, "lxml")
         self.base_url = base_url
+        self._body = None
 
     def get_links(self):
         parsed_url = urlparse(self.base_url)
@@ -37,10 +45,13 @@ class Extractor:
 
 
     def get_body(self):
-        try:
-            return self.soup.body.get_text(" ",strip=True)
-        except:
-            pass
+        # the address scanners all read the body text; extract it once
+        if self._body is None:
+            try:
+                self._body = self.soup.body.get_text(" ",strip=True)
+            except AttributeError:  # no <body>
+                pass
+        return self._body
 
     def get_title(self):
         try:
@@ -67,42 +78,20 @@ class Extractor:
 
     # match email addresses from body
     def get_emails(self):
-        try:
-            match = re.findall(r'[\w\.-]+@[\w\.-]+', self.html)
-            return match
-        except:
-            return None
+        return EMAIL_RE.findall(self.html)
 
 
     def get_pgps(self):
-        try:
-            match = re.findall(r'-----BEGIN PGP PUBLIC KEY BLOCK-----((?s).*)-----END PGP PUBLIC KEY BLOCK-----', self.html)
-            return match
-        except:
-            return None
+        return PGP_RE.findall(self.html)
 
     # match bitcoin addresses from body
     def get_bitcoin_addrs(self):
-        try:
-            _find = re.findall('[13][a-km-zA-HJ-NP-Z1-9]{25,34}', self.get_body())
-            return _find
-        except:
-            return None
+        return BTC_RE.findall(self.get_body() or "")
 
     # match eth addresses from body
     def get_eth_addrs(self):
-        try:
-            _find = re.findall('0x[a-fA-F0-9]{40}', self.get_body())
-            return _find
-        except:
-            return None
+        return ETH_RE.findall(self.get_body() or "")
 
     # match monero addresses from body
     def get_monero_addrs(self):
-        try:
-            _find = re.findall('4[0-9AB][1-9A-HJ-NP-Za-km-z]{93}', self.get_body())
-            return _find
-        except:
-            return None
-
-
+        return XMR_RE.findall(self.get_body() or "")
@@ -8,6 +8,7 @@ from .data_storage import DataStorage
 import uuid
 from urllib.parse import urlparse
 
+from pymongo.errors import DuplicateKeyError
 from rq import Queue
 
 from .worker_connector import redis_connection
@@ -46,7 +47,12 @@ class Spider:
             if self.re_crawl:
                 ds.update_crawled_url(self.base_url, data)
         else:
-            return ds.add_crawled_url(data)
+            try:
+                return ds.add_crawled_url(data)
+            except DuplicateKeyError:
+                # another worker stored it since the check above
+                if self.re_crawl:
+                    ds.update_crawled_url(self.base_url, data)
 
     def proccess(self):
 
@@ -1,6 +1,6 @@
 import redis
 import click
-from rq import Connection, Worker
+from rq import Queue, Worker
 
 redis_url = redis_url = 'redis://redis:6379'
 
@@ -9,51 +9,39 @@ from redis import Redis
 from urllib.parse import urlparse
 
 
+def get_redis_connection(db):
+    # one keepalive pool per worker process instead of ad-hoc sockets
+    url = urlparse(redis_url)
+    pool = redis.BlockingConnectionPool(host=url.hostname, port=url.port, db=db,
+                                        max_connections=32, timeout=5,
+                                        socket_keepalive=True, health_check_interval=30)
+    return Redis(connection_pool=pool)
+
+
 @click.group()
 def workers():
   pass
 
-# there are 4 workers
+# there are 4 workers, each listening on its own redis db
+WORKER_DBS = {
+    'run_panel_worker': 0,     # db 0 is for panel worker
+    'run_app_worker': 1,       # db 1 is for app worker
+    'run_detector_worker': 2,  # db 2 is for detector worker
+    'run_crawler_worker': 3,   # db 3 is for crawler worker
+}
 
-@click.command(name='run_panel_worker')
-def run_panel_worker():
-    url = urlparse(redis_url)
-    redis_connection = Redis(host=url.hostname, port=url.port, db=0)  # db 0 is for panel worker
-    with Connection(redis_connection):
-        worker = Worker('high')
-        worker.work()
 
+def run_worker(db):
+    # pass the connection explicitly; rq 2 drops the Connection context manager
+    redis_connection = get_redis_connection(db)
+    queues = (Queue('high', connection=redis_connection),)
+    worker = Worker(queues, connection=redis_connection)
+    worker.work()
 
-@click.command(name='run_app_worker')
-def run_app_worker():
-    url = urlparse(redis_url)
-    redis_connection = Redis(host=url.hostname, port=url.port, db=1)  # db 1 is for app worker
-    with Connection(redis_connection):
-        worker = Worker('high')
-        worker.work()
 
+for name, db in WORKER_DBS.items():
+    workers.add_command(click.command(name=name)(lambda db=db: run_worker(db)))
 
-@click.command(name='run_detector_worker')
-def run_detector_worker():
-    url = urlparse(redis_url)
-    redis_connection = Redis(host=url.hostname, port=url.port, db=2)  # db 2 is for detector worker
-    with Connection(redis_connection):
-        worker = Worker('high')
-        worker.work()
-
-
-@click.command(name='run_crawler_worker')
-def run_crawler_worker():
-    url = urlparse(redis_url)
-    redis_connection = Redis(host=url.hostname, port=url.port, db=3)  # db 3 is for crawler worker
-    with Connection(redis_connection):
-        worker = Worker('high')
-        worker.work()
-
-workers.add_command(run_panel_worker)
-workers.add_command(run_app_worker)
-workers.add_command(run_detector_worker)
-workers.add_command(run_crawler_worker)
  
 if __name__ == '__main__':
     workers()
\ No newline at end of file
@@ -1,4 +1,8 @@
+from functools import lru_cache
+
+import click
 from flask import Flask, redirect, url_for, send_from_directory
+from markupsafe import Markup
 import flask_login
 from flask_wtf.csrf import CSRFProtect
 from pymongo import MongoClient
@@ -26,6 +30,10 @@ app.config['SESSION_TYPE'] = 'filesystem'
 app.config['CAPTCHA_ENABLE'] = True
 app.config['CAPTCHA_LENGTH'] = 4
 
+# templates only change on deploy, so skip the per-render mtime check
+app.config['TEMPLATES_AUTO_RELOAD'] = False
+app.jinja_env.auto_reload = False
+
 
 login_manager = flask_login.LoginManager()
 login_manager.init_app(app)
@@ -40,7 +48,49 @@ csrf.init_app(app)
 captcha = SessionCaptcha(app)
 
 
-client = MongoClient(mongodb_uri)
+# bounded pool so dashboard bursts queue briefly instead of opening sockets
+# without limit, and fail fast when mongodb is unreachable
+client = MongoClient(mongodb_uri, maxPoolSize=50,
+                     waitQueueTimeoutMS=2000, serverSelectionTimeoutMS=3000,
+                     compressors='zlib')
+# attribute access on the client builds new Database/Collection objects,
+# so resolve the collections once and share them
+documents = client.crawler.documents
+users = client.crawler.users
+
+from .indexes import ensure_indexes, ensure_text_index, find_duplicate_urls
+
+
+# run once per deploy with `flask create-indexes`, not on every import of the
+# web app by a work horse
+@app.cli.command('create-indexes')
+def create_indexes():
+    ensure_indexes(client.crawler)
+
+
+@app.cli.command('create-text-index')
+def create_text_index():
+    ensure_text_index(client.crawler)
+
+
+@app.cli.command('dedupe-urls')
+@click.option('--delete', is_flag=True,
+              help='Delete the duplicates instead of only listing them.')
+def dedupe_urls(delete):
+    """List (or delete) all but the oldest document of each duplicated url.
+
+    The unique url index can't be built while duplicates exist. Deleted
+    copies take their reports, subjects and exif tags with them, and pages
+    crawled from them lose their parent, so review the list first.
+    """
+    total = 0
+    for url, keep, extra in find_duplicate_urls(client.crawler):
+        click.echo("%s: keep %s, %s %s" % (url, keep, "delete" if delete else "would delete",
+                                          " ".join(map(str, extra))))
+        if delete:
+            documents.delete_many({"_id": {"$in": extra}})
+        total += len(extra)
+    click.echo("%d duplicate documents %s" % (total, "deleted" if delete else "found"))
 
 from werkzeug.security import generate_password_hash
 from pymongo.errors import DuplicateKeyError
@@ -56,6 +106,22 @@ from pymongo.errors import DuplicateKeyError
 
 
 from .filters import *
+from .search.forms import SearchForm
+
+
+@lru_cache(maxsize=1)
+def _search_form_widgets():
+    # the navbar search box is the same on every page except for its csrf
+    # token, which base.html renders itself, so build the widgets only once
+    form = SearchForm(formdata=None, meta={'csrf': False})
+    return {'search_phrase_html': Markup(form.phrase(class_="form-control")),
+            'search_submit_html': Markup(form.submit(class_="btn btn-default"))}
+
+
+@app.context_processor
+def inject_search_form():
+    return _search_form_widgets()
+
 from .auth import authbp
 app.register_blueprint(authbp, url_prefix='/auth')
 
@@ -73,7 +139,7 @@ app.register_blueprint(dashboardbp, url_prefix='/dashboard')
 
 @login_manager.user_loader
 def load_user(id):
-    u = client.crawler.users.find_one({"_id": id})
+    u = users.find_one({"_id": id})
     if not u:
         return None
     return User(u['_id'])
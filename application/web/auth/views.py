@@ -1,9 +1,8 @@
 from flask import render_template, redirect, request, url_for, flash
 from flask_login import login_user, logout_user, current_user
-from .. import captcha, client
+from .. import captcha, users
 from ..models import User
 
-from ..search.forms import SearchForm
 from . import authbp
 from .forms import *
 
@@ -17,7 +16,7 @@ def login():
         # print ("TEST")
         if request.method == 'POST' and form.validate_on_submit():
             # print("TEST1")
-            user = client.crawler.users.find_one({"_id": form.username.data})
+            user = users.find_one({"_id": form.username.data})
             if user and User.validate_login(user['password'], form.password.data):
                 user_obj = User(user['_id'])
                 login_user(user_obj)
@@ -27,9 +26,7 @@ def login():
     elif not captcha.validate():
         flash("Captcha is wrong!", 'danger')
 
-    print (form.errors)
-    search_form = SearchForm()
-    return render_template('auth/login.html', title='login', form=form, search_form=search_form)
+    return render_template('auth/login.html', title='login', form=form)
 
 @authbp.route('/logout')
 def logout():
@@ -0,0 +1,88 @@
+import threading
+import time
+from concurrent.futures import Future
+from functools import wraps
+
+import orjson
+from redis import Redis
+from redis.exceptions import RedisError
+from urllib.parse import urlparse
+
+from .config import redis_uri
+
+url = urlparse(redis_uri)
+cache_connection = Redis(host=url.hostname, port=url.port, db=4)  # db 4 is for cached query results
+
+
+def redis_memoize(ttl):
+    """
+    Caches a function's JSON-serializable result in redis for `ttl` seconds,
+    keyed on the function name and its positional arguments.
+    Falls back to calling the function when redis is unreachable.
+    """
+    def deco(fn):
+        @wraps(fn)
+        def wrapper(*args):
+            key = "stats:%s:%r" % (fn.__name__, args)
+            try:
+                cached = cache_connection.get(key)
+                if cached is not None:
+                    return orjson.loads(cached)
+            except RedisError:
+                return fn(*args)
+
+            result = fn(*args)
+            try:
+                cache_connection.setex(key, ttl, orjson.dumps(result, default=str))
+            except RedisError:
+                pass
+            return result
+        return wrapper
+    return deco
+
+
+def ttl_cache(ttl, maxsize=None):
+    """
+    Keeps a function's result in process memory for `ttl` seconds, keyed on
+    its positional and keyword arguments. Suited to values that cannot be
+    JSON-encoded for redis, like raw mongo documents. With `maxsize` set,
+    the oldest entry is dropped once the cache is full. Concurrent misses
+    on the same key wait for a single call instead of each running it.
+    """
+    def deco(fn):
+        entries = {}
+        inflight = {}
+        lock = threading.Lock()
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = (args, tuple(sorted(kwargs.items())))
+            now = time.monotonic()
+            hit = entries.get(key)
+            if hit is not None and hit[0] > now:
+                return hit[1]
+
+            with lock:
+                future = inflight.get(key)
+                leader = future is None
+                if leader:
+                    future = inflight[key] = Future()
+            if not leader:
+                return future.result()
+
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException as e:
+                future.set_exception(e)
+                raise
+            else:
+                if maxsize is not None and key not in entries and len(entries) >= maxsize:
+                    entries.pop(next(iter(entries), None), None)
+                entries[key] = (time.monotonic() + ttl, result)
+                future.set_result(result)
+                return result
+            finally:
+                with lock:
+                    inflight.pop(key, None)
+        return wrapper
+    return deco
@@ -1,13 +1,12 @@
 import base64
-from random import SystemRandom
+import secrets
 import logging
+import threading
 
 from captcha.image import ImageCaptcha
 from flask import session, request
 from markupsafe import Markup
 
-import string, random
-
 class SessionCaptcha(object):
     def __init__(self, app=None):
         if app is not None:
@@ -16,20 +15,27 @@ class SessionCaptcha(object):
     def init_app(self, app):
         self.enabled = app.config.get("CAPTCHA_ENABLE", True)
         self.digits = app.config.get("CAPTCHA_LENGTH", 5)
-        self.max = 10 ** self.digits
-        self.image_generator = ImageCaptcha(width=200)
-        self.rand = SystemRandom()
-
-        def _generate():
-            if not self.enabled:
-                return ""
-            base64_captcha = self.generate()
-            return Markup("<img src='{}'>".format("data:image/png;base64, {}".format(base64_captcha)))
+        # ImageCaptcha keeps mutable PIL state, so each thread gets its own
+        self._local = threading.local()
+        self._image_generator()
+        self._chars = "qwertyuiopasdfghjklzxcvbnm1234567890"
 
-        app.jinja_env.globals['captcha'] = _generate
+        if self.enabled:
+            _gen = self.generate
+            app.jinja_env.globals['captcha'] = lambda: Markup(f"<img src='data:image/png;base64,{_gen()}'>")
+        else:
+            app.jinja_env.globals['captcha'] = lambda: ""
 
         session_type = app.config.get('SESSION_TYPE', None)
 
+    def _image_generator(self):
+        generator = getattr(self._local, 'generator', None)
+        if generator is None:
+            generator = ImageCaptcha(width=200)
+            generator.truefonts  # load the fonts now rather than on first render
+            self._local.generator = generator
+        return generator
+
     def generate(self):
         """
         Generates and returns a numeric captcha image in base64 format.
@@ -38,14 +44,10 @@ class SessionCaptcha(object):
         src = captcha.generate()
         <img src="{{src}}">
         """
-        answer = self.rand.randrange(self.max)
-        answer = str(answer).zfill(self.digits)
-
-        chars = "qwertyuiopasdfghjklzxcvbnm1234567890"
-        for _ in answer:
-            answer = answer.replace(_,random.choice(chars))
+        # secrets.choice draws uniformly; mapping raw bytes mod 36 would favour some chars
+        answer = "".join(secrets.choice(self._chars) for _ in range(self.digits))
 
-        image_data = self.image_generator.generate(answer)
+        image_data = self._image_generator().generate(answer)
         base64_captcha = base64.b64encode(image_data.getvalue()).decode("ascii")
         logging.debug('Generated captcha with answer: ' + answer)
         session['captcha_answer'] = answer
@@ -1,8 +1,13 @@
-import dateutil.parser
-from flask import request, redirect, url_for, flash, render_template
+import datetime
+import logging
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import request, redirect, url_for, flash, render_template, abort
 from flask_login import login_required
-from pymongo import DESCENDING
-from .. import client
+from pymongo.errors import PyMongoError
+from .. import documents
 # from web import q
 from .. import run_crawler
 
@@ -10,13 +15,13 @@ from ..scanner.exif_data import detect_exif_metadata
 
 from ..config import *
 from ..filters import *
-from ..helper import extract_onions
+from ..helper import extract_onions, extract_onions_from_file
 from ..search.forms import SearchForm
+from ..paginate import after_arg, seen_before, LIST_PROJECTION
 from ..stats import onion_stats as oss
-from ..paginate import Pagination
-from ..scanner import text_subjects, exif_data
+from ..scanner import text_subjects
 
-from ..queues import detector_q, crawler_q
+from ..queues import detector_q, crawler_q, enqueue_many
 
 from werkzeug.utils import secure_filename
 from . import dashboardbp
@@ -24,49 +29,51 @@ from .forms import *
 
 from bson import ObjectId
 
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(max_workers=4)
+
+# the hidden service list also shows how many links each page has
+HS_LIST_PROJECTION = dict(LIST_PROJECTION, links=1)
+
 
 @dashboardbp.route('/hs/<id>', methods=["GET"])
 def hs_view(id=1):
-    search_form = SearchForm()
-    try:
-        child_data = []
-        result = client.crawler.documents.find_one({"_id":ObjectId(id)})
-        if result['links']:
-            for item in result['links']:
-                child_data.append(client.crawler.documents.find_one({"url":item['url']}))
-    except:
-        print ("ERROR")
+    if not ObjectId.is_valid(id):
+        abort(404)
+    result = documents.find_one({"_id": ObjectId(id)})
+    if result is None:
+        abort(404)
     return render_template('dashboard/hs.html',
-                           item=result,
-                           child_data=child_data,
-                           search_form=search_form)
+                           item=result)
 
 
 @dashboardbp.route('/hs_directory/', methods=["GET"])
-@dashboardbp.route('/hs_directory/<int:page_number>', methods=["GET"])
-def hs_directory(page_number=1):
-    search_form = SearchForm()
+def hs_directory():
+    # same (seen_time, _id) keyset as the public directory, so re-crawled
+    # pages move to the top here too
+    after = after_arg()
     try:
-        all_count = client.crawler.documents.find({'status':200}).count()
-        pagination = Pagination(page_number, n_per_page, all_count)
-        all = client.crawler.documents.find({ "$and":[{'status':200}, {"in_scope": {"$eq": False}}]}).sort("seen_time", DESCENDING).skip(
-            (page_number - 1) * n_per_page).limit(n_per_page)
-    except:
-        print ("ERROR")
+        all_count = oss.count_documents(status=200, in_scope=False)
+        all, next_after = seen_before({'status': 200, 'in_scope': False}, after,
+                                      HS_LIST_PROJECTION)
+    except PyMongoError:
+        logger.exception("hs_directory query failed")
         return render_template('dashboard/hs_directory.html',
-                               search_form=search_form,
                                all_count=0)
 
     return render_template('dashboard/hs_directory.html',
                            results=all,
-                           pagination=pagination,
-                           search_form=search_form,
+                           next_after=next_after,
+                           is_first=after is None,
                            all_count=all_count)
 
 
 @dashboardbp.route('/hs/detect_exif/<id>', methods=['GET', 'POST'])
 @login_required
 def detect_exif_data(id):
+    if not ObjectId.is_valid(id):
+        abort(404)
     if detect_exif_metadata(id):
         flash("EXIF detection started.")
         return redirect(url_for('dashboard.hs_view', id=id))
@@ -76,6 +83,8 @@ def detect_exif_data(id):
 @dashboardbp.route('/hs/detect_subject/<id>', methods=['GET', 'POST'])
 @login_required
 def detect_subjects(id):
+    if not ObjectId.is_valid(id):
+        abort(404)
     detector_q.enqueue_call(text_subjects._text_subject, args=(id,), ttl=86400, result_ttl=1)
     flash("Detecting started.", "success")
     return redirect(url_for('dashboard.hs_view', id=id))
@@ -95,62 +104,60 @@ def settings():
 @dashboardbp.route('/upload_seed', methods=['GET', 'POST'])
 @login_required
 def upload_seed():
-    search_form = SearchForm(request.form)
     multiple_urls_form = MultipleOnion()
-    if multiple_urls_form.validate_on_submit():
+    if request.method == "POST" and multiple_urls_form.validate_on_submit():
         seeds = []
-        print("FORM")
+        logger.debug("seed upload form submitted")
         if multiple_urls_form.seed_file.data:
             filename = secure_filename(multiple_urls_form.seed_file.data.filename)
-            path_to_save = seed_upload_dir + filename
-            multiple_urls_form.seed_file.data.save(path_to_save)
-
-            _seed_file = open(path_to_save, 'r')
-            seed_file = extract_onions(_seed_file.read())
-            _seed_file.close()
+            path_to_save = os.path.join(seed_upload_dir, filename)
+            with open(path_to_save, 'wb', buffering=1 << 20) as f:
+                shutil.copyfileobj(multiple_urls_form.seed_file.data.stream, f, 1 << 20)
 
-            for seed in seed_file:
-                seeds.append(seed.strip())
+            seeds.extend(extract_onions_from_file(path_to_save))
 
         # print (multiple_urls_form.urls.data)
         # print ("*"*100)
         if multiple_urls_form.urls.data:
-            urls = extract_onions(multiple_urls_form.urls.data)
-            for url in urls:
-                seeds.append(url.strip())
+            seeds.extend(extract_onions(multiple_urls_form.urls.data))
 
-        for seed in seeds:
-            print(seed)
-            crawler_q.enqueue_call(func=run_crawler, args=(seed,), ttl=86400, result_ttl=1)
-            # sleep(0.1) #delay between jobs
-            # print (job.result)
+        enqueue_many(crawler_q, run_crawler, [(seed,) for seed in seeds], ttl=86400, result_ttl=1)
 
         flash('New onions added to crawler queue ', 'success')
-        return render_template('dashboard/upload_seed.html', search_form=search_form,
+        return render_template('dashboard/upload_seed.html',
                                multiple_urls_form=multiple_urls_form)
 
-    return render_template('dashboard/upload_seed.html', search_form=search_form,
+    return render_template('dashboard/upload_seed.html',
                            multiple_urls_form=multiple_urls_form)
 
 
-    print (multiple_urls_form.errors)
-
 
 @dashboardbp.route('/', methods=['GET', 'POST'])
 @login_required
 def dashboard():
-    search_form = SearchForm(request.form)
     range_stats_form = RangeStats()
-    status_count = oss.get_requests_stats_all()
-    # print ("*"*1000)
+    is_post = request.method == "POST"
+
+    # a navbar search only redirects, so answer it before querying anything
+    if is_post:
+        search_form = SearchForm(request.form)
+        if search_form.validate_on_submit():
+            return redirect(url_for('search.search', phrase=search_form.phrase.data.lower()))
+
+    # the two queries are independent; pymongo releases the GIL on IO
+    last_200_f = _executor.submit(oss.get_recent_documents, status=200)
+    last_all_f = _executor.submit(oss.get_recent_documents)
     last_200 = 0
     last_all = 0
 
     try:
-        last_200 = client.crawler.documents.find({"status": 200}).sort("seen_time", DESCENDING).limit(20)
-        last_all = client.crawler.documents.find().sort("seen_time", DESCENDING).limit(20)
-    except:
-        print ("ERROR")
+        last_200 = last_200_f.result()
+    except PyMongoError:
+        logger.exception("recent documents query failed")
+    try:
+        last_all = last_all_f.result()
+    except PyMongoError:
+        logger.exception("recent documents query failed")
 
         # return render_template('dashboard.html', search_form=search_form,
         #                        range_stats=range_stats_form, multiple_urls_form=multiple_urls_form)
@@ -158,27 +165,19 @@ def dashboard():
     # print(list(last_200))
     # print(list(last_all))
 
-    if search_form.validate_on_submit():
-        return redirect(url_for('.search', phrase=search_form.phrase.data.lower()))
+    ctx = {'range_stats': range_stats_form,
+           'last_200': last_200,
+           'last_all': last_all}
 
-    if range_stats_form.validate_on_submit():
+    if is_post and range_stats_form.validate_on_submit():
         if range_stats_form.from_dt.data and range_stats_form.to_dt.data:
-            time_series = oss.get_requests_stats(
-                dateutil.parser.parse(str(range_stats_form.from_dt.data)),
-                dateutil.parser.parse(str(range_stats_form.to_dt.data))
+            # DateField yields dates; mongo needs datetimes at midnight
+            ctx['time_series'] = oss.get_requests_stats(
+                datetime.datetime.combine(range_stats_form.from_dt.data, datetime.time.min),
+                datetime.datetime.combine(range_stats_form.to_dt.data, datetime.time.min)
             )
-            return render_template('dashboard/dashboard.html', search_form=search_form,
-                                   status_count=status_count, range_stats=range_stats_form,
-                                   time_series=time_series,multiple_urls_form=multiple_urls_form,
-                                   last_200=last_200, last_all=last_all)
-
-
-
-
 
-    return render_template('dashboard/dashboard.html', search_form=search_form,
-                           status_count=status_count, range_stats=range_stats_form,
-                            last_200=last_200, last_all=last_all)
+    return render_template('dashboard/dashboard.html', **ctx)
 
 
 
@@ -1,18 +1,35 @@
-from flask_wtf.csrf import CSRFError
+from functools import lru_cache
+
+from flask_wtf.csrf import CSRFError, generate_csrf
 from . import app
-from flask import render_template
+from flask import render_template, Response
+
+CSRF_SLOT = b"__CSRF__"
+
+ERROR_PAGES = {
+    'csrf': ("Session expired", "401", "Form session expired."),
+    'not_found': ("PAGE NOT FOUND", "404", "Requested page not found."),
+}
+
+
+@lru_cache(maxsize=32)
+def _render_error_shell(title, code, description):
+    # the navbar CSRF token is the only per-request part of an error page,
+    # so render each page on its first use and leave a slot for the token
+    html = render_template('error.html', title=title, code=code, description=description)
+    return html.replace(generate_csrf(), CSRF_SLOT.decode()).encode('utf8')
+
+
+def render_error(title, code, description):
+    body = _render_error_shell(title, code, description).replace(CSRF_SLOT, generate_csrf().encode())
+    return Response(body, status=int(code), mimetype='text/html')
 
-from .search.forms import SearchForm
 
 @app.errorhandler(CSRFError)
 def handle_csrf_error(e):
-    search_form = SearchForm()
-    return render_template('error.html', title="Session expired", code="401", description="Form session expired.",
-                           search_form=search_form)
+    return render_error(*ERROR_PAGES['csrf'])
 
 
 @app.errorhandler(404)
 def page_not_found(e):
-    search_form = SearchForm()
-    return render_template('error.html', title="PAGE NOT FOUND", code="404", description="Requested page not found.",
-                           search_form=search_form)
\ No newline at end of file
+    return render_error(*ERROR_PAGES['not_found'])
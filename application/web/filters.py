@@ -1,18 +1,21 @@
 from . import app
 
-from pytz import timezone
+from datetime import timezone
+
+UTC = timezone.utc
 
 @app.template_filter('datetimeformat')
 def datetimeformat(value, format='%d-%m-%Y - %H:%M:%S'):
     if value:
-        value = value.replace(tzinfo=timezone('UTC'))
-        return value.strftime(format)
+        return value.replace(tzinfo=UTC).strftime(format)
 
 @app.template_filter('limitbody')
 def limitbody(value, size=700):
     if value:
         body = value.strip()
-        return ("%s..." % body[:size] )
+        if len(body) <= size:
+            return body
+        return f"{body[:size]}..."
 
 # @app.template_filter('recreate_neturi')
 # def recreate_neturi(base_url, con_url):
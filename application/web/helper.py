@@ -1,16 +1,23 @@
 import re
 
-def extract_onions(s):
-    result = []
-    print(s)
-    for m in re.finditer(r'(?:https?://)?(?:www)?(\S*?\.onion)\b', s, re.M | re.IGNORECASE):
-        url = str(m.group(0))
-        # url = url[len(url) - 22:]
-        # if "'" in url:
-        #     url = url[url.index("'")+1:]
-        result.append(url)
-    print(result)
-    return result
+# bounded run instead of a lazy \S*?, so long unbroken input scans linearly
+ONION_PATTERN = re.compile(r'\S{0,128}?\.onion\b', re.IGNORECASE)
+ONION_TLD = re.compile(r'\.onion', re.IGNORECASE)
+
 
+def extract_onions(s):
+    # most text has no onion at all; one literal scan settles that before
+    # the full pattern runs
+    if not ONION_TLD.search(s):
+        return []
+    return ONION_PATTERN.findall(s)
 
 
+def extract_onions_from_file(path):
+    # read line by line so peak memory follows the longest line, not the file
+    seen = {}
+    with open(path, 'rb', buffering=1 << 20) as f:
+        for line in f:
+            for url in extract_onions(line.decode('utf8', 'ignore')):
+                seen[url] = None
+    return list(seen)
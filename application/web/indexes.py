@@ -0,0 +1,49 @@
+import logging
+
+from pymongo import ASCENDING, DESCENDING, TEXT
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger(__name__)
+
+# key specs are shared with the queries that hint them
+# _id breaks seen_time ties, so keyset pages sort straight off these
+STATUS_SEEN_TIME = [("status", ASCENDING), ("seen_time", DESCENDING), ("_id", DESCENDING)]
+SEEN_TIME = [("seen_time", DESCENDING), ("_id", DESCENDING)]
+BODY_TEXT = [("body", TEXT)]
+URL = [("url", ASCENDING)]
+SEEN_TIME_STATUS = [("seen_time", ASCENDING), ("status", ASCENDING)]
+
+
+def find_duplicate_urls(db):
+    """
+    Yields (url, keep, extra) for every url stored more than once, where
+    `keep` is the oldest document's _id and `extra` the ids of the others.
+    """
+    pipeline = [{"$match": {"url": {"$exists": True}}},
+                {"$sort": {"_id": 1}},
+                {"$group": {"_id": "$url", "ids": {"$push": "$_id"}, "n": {"$sum": 1}}},
+                {"$match": {"n": {"$gt": 1}}}]
+    for group in db.documents.aggregate(pipeline, allowDiskUse=True):
+        yield group["_id"], group["ids"][0], group["ids"][1:]
+
+
+def ensure_indexes(db):
+    specs = [
+        (STATUS_SEEN_TIME, {}),
+        (SEEN_TIME, {}),
+        # one document per url; the crawler relies on it to dedupe inserts
+        (URL, {"unique": True, "partialFilterExpression": {"url": {"$exists": True}}}),
+        (SEEN_TIME_STATUS, {}),
+    ]
+    # built one by one, so existing duplicate urls can't block the others
+    for keys, options in specs:
+        try:
+            db.documents.create_index(keys, **options)
+        except PyMongoError:
+            logger.exception("could not create document index %s", keys)
+
+
+def ensure_text_index(db):
+    # a full scan of every page body, so it is built on request only;
+    # search falls back to a regex scan until it exists
+    db.documents.create_index(BODY_TEXT, default_language="english")
@@ -1,32 +1,45 @@
-from math import ceil
-class Pagination(object):
-    def __init__(self, page, per_page, total_count):
-        self.page = page
-        self.per_page = per_page
-        self.total_count = total_count
-
-    @property
-    def pages(self):
-        return int(ceil(self.total_count / float(self.per_page)))
-
-    @property
-    def has_prev(self):
-        return self.page > 1
-
-    @property
-    def has_next(self):
-        return self.page < self.pages
-
-    def iter_pages(self, left_edge=2, left_current=2,
-                   right_current=5, right_edge=2):
-        last = 0
-        for num in range(1, self.pages + 1):
-            if num <= left_edge or \
-                    (num > self.page - left_current - 1 and \
-                                 num < self.page + right_current) or \
-                            num > self.pages - right_edge:
-                if last + 1 != num:
-                    yield None
-                yield num
-                last = num
+import datetime
 
+from bson.errors import InvalidId
+from bson.objectid import ObjectId
+from flask import request, abort
+from pymongo import DESCENDING
+
+from . import documents
+from .config import n_per_page
+
+
+def after_arg():
+    # pages are keyed by the seen_time and _id of the previous page's last item
+    after = request.args.get('after')
+    if not after:
+        return None
+    seen_time, _, oid = after.rpartition('_')
+    try:
+        return datetime.datetime.fromisoformat(seen_time), ObjectId(oid)
+    except (ValueError, InvalidId):
+        abort(404)
+
+
+# list pages only render a short body snippet (limitbody), so ship a prefix
+# of the body instead of the whole page text and html
+LIST_PROJECTION = {"url": 1, "title": 1, "seen_time": 1, "status": 1, "capture_id": 1,
+                   "body": {"$substrCP": ["$body", 0, 1024]}}
+LIST_SORT = [("seen_time", DESCENDING), ("_id", DESCENDING)]
+
+
+def seen_before(query, after, projection=LIST_PROJECTION):
+    # range on (seen_time, _id) instead of skip(), so deep pages cost the same
+    # as the first and pages split inside a run of equal seen_times lose nothing
+    if after is not None:
+        seen_time, oid = after
+        query = dict(query, **{'$or': [{'seen_time': {'$lt': seen_time}},
+                                       {'seen_time': seen_time, '_id': {'$lt': oid}}]})
+    # one batch holds the whole page, so it arrives in a single round trip
+    all = list(documents.find(query, projection).sort(LIST_SORT)
+               .batch_size(n_per_page + 1).limit(n_per_page + 1))
+    next_after = None
+    if len(all) > n_per_page and all[n_per_page - 1].get('seen_time'):
+        last = all[n_per_page - 1]
+        next_after = "%s_%s" % (last['seen_time'].isoformat(), last['_id'])
+    return all[:n_per_page], next_after
@@ -13,4 +13,23 @@ crawler_connection = Redis(host=url.hostname, port=url.port, db=3)  # db 3 is fo
 panel_q = Queue(name="high", connection=panel_connection)
 app_q = Queue(name="high", connection=app_connection)
 detector_q = Queue(name="high", connection=detector_connection)
-crawler_q = Queue(name="high", connection=crawler_connection)
\ No newline at end of file
+crawler_q = Queue(name="high", connection=crawler_connection)
+
+
+ENQUEUE_BATCH_SIZE = 256
+
+
+def enqueue_many(queue, func, args_list, ttl, result_ttl):
+    """
+    Enqueues one job per args tuple through redis pipelines of
+    ENQUEUE_BATCH_SIZE jobs, so a large seed list costs a round trip per
+    batch instead of one per job without building one huge pipeline.
+    """
+    job_datas = [Queue.prepare_data(func, args=args, ttl=ttl, result_ttl=result_ttl)
+                 for args in args_list]
+    jobs = []
+    for i in range(0, len(job_datas), ENQUEUE_BATCH_SIZE):
+        with queue.connection.pipeline() as pipe:
+            jobs.extend(queue.enqueue_many(job_datas[i:i + ENQUEUE_BATCH_SIZE], pipeline=pipe))
+            pipe.execute()
+    return jobs
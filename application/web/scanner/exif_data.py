@@ -1,48 +1,204 @@
-from homura import download
-from urllib.parse import urlparse, urlunparse
+from urllib.parse import urljoin, urlparse
 from ..queues import detector_q
-from .. import client
-# from .crawler.html_extractors import Extractor
+from .. import documents
 from bson import ObjectId
 from .. import config
+from ..cache import cache_connection
 
 
 
 
-import uuid
+import hashlib
+import io
 import exifread
+import orjson
 import pycurl
 
-from os.path import splitext
+# EXIF lives in the first few KB of JPEG/TIFF files, so only fetch the head
+# of each image; the wider range is a retry for images with large preambles
+EXIF_HEAD_SIZE = 65536
+EXIF_FALLBACK_SIZE = 524288
+EXIF_RANGE = "0-%d" % (EXIF_HEAD_SIZE - 1)
+EXIF_FALLBACK_RANGE = "0-%d" % (EXIF_FALLBACK_SIZE - 1)
+# only these formats carry EXIF that a wider fetch could still reach
+EXIF_MAGIC = (b"\xff\xd8", b"II*\x00", b"MM\x00*")
+# a hung hidden service must not hold up the rest of a batch
+EXIF_CONNECT_TIMEOUT = 30
+EXIF_TIMEOUT = 60
 
-def set_exif_data(id, tags):
+def add_exif_tags(id, tags):
     try:
-        client.crawler.documents.update_one({'_id': ObjectId(id)}, {"$set": tags}, upsert=False)
+        documents.update_one({'_id': ObjectId(id)}, {"$addToSet": {'exif': {'$each': sorted(tags)}}}, upsert=False)
     except:
         return None
 
-def download_and_detect(id, url, filename):
-    # try:
-        opt = {pycurl.PROXY: config.tor_pool_url,
-               pycurl.PROXYPORT: config.tor_pool_port,
-               pycurl.PROXYTYPE: pycurl.PROXYTYPE_SOCKS5_HOSTNAME}
-        download(url,path=filename, pass_through_opts=opt)
-        f = open (filename, 'rb')
-        tags = exifread.process_file(f)
-        set_exif_data(id, {'exif': tags.keys()})
-        f.close()
-    # except:
-    #     return None
+# dns and tls sessions are shared by every handle of the job (rq forks a
+# horse per job), so a batch and its retry resolve the tor proxy only once
+_curl_share = pycurl.CurlShare()
+_curl_share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_DNS)
+_curl_share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_SSL_SESSION)
+
+
+class _CappedBuffer(object):
+    # Range is only advisory; a server that ignores it would stream the whole
+    # file, so keep the first `limit` bytes and abort the transfer after that
+    def __init__(self, limit):
+        self.data = bytearray()
+        self.limit = limit
+
+    def write(self, chunk):
+        room = self.limit - len(self.data)
+        self.data += chunk[:room]
+        if len(chunk) > room:
+            return 0  # curl aborts with E_WRITE_ERROR
+
+
+def _tor_curl(url, buf, byte_range):
+    c = pycurl.Curl()
+    c.setopt(pycurl.SHARE, _curl_share)
+    c.setopt(pycurl.URL, url)
+    c.setopt(pycurl.PROXY, config.tor_pool_url)
+    c.setopt(pycurl.PROXYPORT, config.tor_pool_port)
+    c.setopt(pycurl.PROXYTYPE, pycurl.PROXYTYPE_SOCKS5_HOSTNAME)
+    c.setopt(pycurl.FOLLOWLOCATION, True)
+    c.setopt(pycurl.FAILONERROR, True)
+    c.setopt(pycurl.CONNECTTIMEOUT, EXIF_CONNECT_TIMEOUT)
+    c.setopt(pycurl.TIMEOUT, EXIF_TIMEOUT)
+    c.setopt(pycurl.RANGE, byte_range)
+    c.setopt(pycurl.WRITEFUNCTION, buf.write)
+    return c
+
+def _parse_exif(buf):
+    # only tag names are stored, so skip makernotes and the thumbnail
+    return exifread.process_file(buf, details=False, debug=False)
+
+def _tag_names(data):
+    if not data:
+        return []
+    try:
+        return list(_parse_exif(io.BytesIO(data)).keys())
+    except Exception:
+        # truncated heads can trip exifread; one bad image mustn't sink the batch
+        return []
+
+def _parse_all(heads):
+    # a few 64 KiB heads parse faster inline than they pickle to a pool
+    return [_tag_names(h) for h in heads]
+
+def _fetch_heads(urls, byte_range, limit):
+    """
+    Fetches the head of every url concurrently on one CurlMulti handle.
+    Returns the bytes of each head, or None where the fetch failed.
+    """
+    multi = pycurl.CurlMulti()
+    handles = []
+    for url in urls:
+        buf = _CappedBuffer(limit)
+        c = _tor_curl(url, buf, byte_range)
+        multi.add_handle(c)
+        handles.append((c, buf))
+
+    while True:
+        ret, num_handles = multi.perform()
+        if ret != pycurl.E_CALL_MULTI_PERFORM:
+            break
+    while num_handles:
+        if multi.select(1.0) == -1:
+            continue
+        while True:
+            ret, num_handles = multi.perform()
+            if ret != pycurl.E_CALL_MULTI_PERFORM:
+                break
+
+    failed = set()
+    while True:
+        queued, _, errors = multi.info_read()
+        # a write error is our own cap kicking in; the head is still good
+        failed.update(c for c, errno, errmsg in errors if errno != pycurl.E_WRITE_ERROR)
+        if not queued:
+            break
+
+    heads = []
+    for c, buf in handles:
+        heads.append(None if c in failed else bytes(buf.data))
+        multi.remove_handle(c)
+        c.close()
+    multi.close()
+    return heads
+
+def _is_truncated(head):
+    return head is not None and len(head) >= EXIF_HEAD_SIZE and head.startswith(EXIF_MAGIC)
+
+def _detect(urls):
+    """
+    Returns the EXIF tag names of every image url, or None where the image
+    could not be fetched. Only JPEG/TIFF heads that filled the first range
+    without a hit get one wider retry, fetched together as a second batch.
+    """
+    heads = _fetch_heads(urls, EXIF_RANGE, EXIF_HEAD_SIZE)
+    names = [found if head is not None else None
+             for head, found in zip(heads, _parse_all(heads))]
+    retry = [i for i, head in enumerate(heads) if not names[i] and _is_truncated(head)]
+    if retry:
+        wide = _fetch_heads([urls[i] for i in retry], EXIF_FALLBACK_RANGE, EXIF_FALLBACK_SIZE)
+        for i, head, found in zip(retry, wide, _parse_all(wide)):
+            names[i] = found if head is not None else None
+    return names
+
+def _tags_key(url):
+    return "exif:tags:" + hashlib.sha1(url.encode()).hexdigest()
+
+def cached_image_tags(urls):
+    """
+    Returns the tag names parsed for each url within the last EXIF_TAGS_TTL
+    seconds (site-wide logos and the like), or None where there are none.
+    """
+    return [orjson.loads(v) if v is not None else None
+            for v in cache_connection.mget([_tags_key(url) for url in urls])]
+
+def cache_image_tags(urls, names):
+    # only successful parses are cached, so a timeout is retried next time
+    with cache_connection.pipeline(transaction=False) as pipe:
+        for url, found in zip(urls, names):
+            if found is not None:
+                pipe.set(_tags_key(url), orjson.dumps(found), ex=config.EXIF_TAGS_TTL)
+        pipe.execute()
+
+def batch_download_and_detect(id, urls):
+    """
+    Fetches the head of every image of a document not parsed recently,
+    concurrently on one CurlMulti handle, then stores the union of their
+    EXIF tags and the cached tags of the rest in one update.
+    """
+    urls = list(dict.fromkeys(urls))
+    cached = cached_image_tags(urls)
+    misses = [url for url, names in zip(urls, cached) if names is None]
+    detected = _detect(misses) if misses else []
+    cache_image_tags(misses, detected)
+
+    tags = set()
+    for names in cached + detected:
+        if names:
+            tags.update(names)
+
+    add_exif_tags(id, list(tags))
+    return True
+
+def iter_img_links(base_url, images):
+    """
+    Yields the absolute url of every image src the spider stored for a page.
+    """
+    for src in images:
+        if src:
+            src = urljoin(base_url, src.strip())
+            if urlparse(src).scheme in ('http', 'https'):
+                yield src
 
 def detect_exif_metadata(id):
 
-    # data = client.crawler.documents.find_one({"_id": ObjectId(id)})
-    # exta = Extractor(base_url=data['url'], html=data['html'])
-    # srcs = exta.get_img_links()
-    # for src in srcs:
-    #     n, ext = splitext(urlparse(src).path)
-    #     obj_uuid = uuid.uuid4().hex
-    #     path = config.get_exif_save_path(obj_uuid, ext)
-    #     detector_q.enqueue_call(download_and_detect, args=(id, src, path), ttl=86400, result_ttl=1)
+    # data = documents.find_one({"_id": ObjectId(id)}, {"url": 1, "images": 1})
+    # srcs = list(dict.fromkeys(iter_img_links(data['url'], data.get('images') or [])))
+    # if srcs:
+    #     detector_q.enqueue_call(batch_download_and_detect, args=(id, srcs), ttl=86400, result_ttl=1)
 
     return True
@@ -1,28 +1,68 @@
-import json
+import hashlib
+import orjson
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from redis.exceptions import RedisError
+from ..cache import cache_connection
 from ..config import spacy_server_url
-# from web.config import mongodb_uri
-
-# from web import client
+from .. import documents
 from bson import ObjectId
 
-from pymongo import MongoClient
+SPACY_CACHE_TTL = 86400  # mirrors and re-crawls often repeat a body verbatim
+
+# rq forks a horse per job, so this session lives for one job; it keeps the
+# connections to the spacy service open across that job's chunk requests
+_SESSION = requests.Session()
+_SESSION.mount('http://', HTTPAdapter(pool_connections=8, pool_maxsize=32,
+                                      max_retries=Retry(total=2, backoff_factor=0.2)))
+
+MIN_BODY_LENGTH = 32  # login walls and captcha pages have nothing to tag
+CHUNK_SIZE = 8192  # long bodies are parsed as chunks in parallel
+_executor = ThreadPoolExecutor(max_workers=4)
+SUBJECT_TAGS = frozenset(("NNP", "NNPS"))
+
+
+def _chunk_text(text, size=CHUNK_SIZE):
+    # the crawler flattens bodies to a single line, so cut by size, backing
+    # up to a sentence end or at least a space so no word is split
+    chunks, start = [], 0
+    while start < len(text):
+        end = start + size
+        if end < len(text):
+            cut = text.rfind('. ', start + size // 2, end)
+            if cut != -1:
+                end = cut + 1
+            else:
+                cut = text.rfind(' ', start, end)
+                if cut > start:
+                    end = cut
+        chunks.append(text[start:end])
+        start = end
+    return chunks
 
-mongodb_uri = "mongodb://%s:%s@mongodb:27017/crawler" % ("admin", "123qwe")
+
+def _post_chunk(text):
+    response = _SESSION.post(spacy_server_url, data=orjson.dumps({'text': text, 'model': 'en'}),
+                             headers={'content-type': 'application/json'}, timeout=30)
+    return orjson.loads(response.content)
 
 
 def _text_subject(id):
     s = SpacyDetector(id)
+    if len(s.whole_text.strip()) < MIN_BODY_LENGTH:
+        s.update({'subjects': []})
+        return True
     return s.get_subjects_and_update()
 
 class SpacyDetector:
 
     def __init__(self, id):
-        self.client = MongoClient(mongodb_uri)
         self.id = id
         # child_data = str
-        result = self.client.crawler.documents.find_one({"_id": ObjectId(id)})
-        self.whole_text = result['body']
+        result = documents.find_one({"_id": ObjectId(id)}, {"body": 1})
+        self.whole_text = (result or {}).get('body') or ""
         # netloc = result['netloc']
         # all_childs = self.client.crawler.documents.find({'netloc': netloc})
         # if all_childs.count() > 0:
@@ -30,25 +70,39 @@ class SpacyDetector:
         #         child_data = "%s\n%s\n" % (child_data, child['body'])
 
             # self.whole_text = child_data
+        self.cache_key = "spacy:" + hashlib.blake2b(self.whole_text.encode('utf-8'), digest_size=16).hexdigest()
+
+    def _cache_get(self, key):
+        try:
+            cached = cache_connection.get(key)
+        except RedisError:
+            return None
+        return orjson.loads(cached) if cached is not None else None
+
+    def _cache_set(self, key, value):
+        try:
+            cache_connection.setex(key, SPACY_CACHE_TTL, orjson.dumps(value))
+        except RedisError:
+            pass
 
     def _get_spacy_subj(self):
-        headers = {'content-type': 'application/json'}
-        d = {'text': self.whole_text, 'model': 'en'}
-        print (d)
-        response = requests.post(spacy_server_url, data=json.dumps(d), headers=headers)
-        r = response.json()
-        # print (vars(r))
-        return r
+        # only the words are used, so the per-chunk replies are simply concatenated
+        return {'words': [word for resp in _executor.map(_post_chunk, _chunk_text(self.whole_text))
+                          for word in resp['words']]}
 
     def get_subjects(self):
-        resp = self._get_spacy_subj()
-        subjs = []
-        for item in resp['words']:
-            if item['tag'] == "NNP" or item['tag'] == "NNPS":
-                subjs.append(item['text'])
+        # only the derived subjects are cached; the raw reply can run to megabytes
+        subj_key = self.cache_key + ":subj"
+        subjs = self._cache_get(subj_key)
+        if subjs is None:
+            resp = self._get_spacy_subj()
+            subjs = list(dict.fromkeys([w['text'] for w in resp['words'] if w['tag'] in SUBJECT_TAGS]))
+            self._cache_set(subj_key, subjs)
         return {'subjects': subjs}
 
+    def update(self, data):
+        documents.update_one({'_id': ObjectId(self.id)}, {"$set": data}, upsert=False)
+
     def get_subjects_and_update(self):
-        subjs = self.get_subjects()
-        self.client.crawler.documents.update_one({'_id': ObjectId(self.id)}, {"$set": subjs}, upsert=False)
+        self.update(self.get_subjects())
         return True
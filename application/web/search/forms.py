@@ -2,21 +2,24 @@
 from flask_wtf import FlaskForm
 from wtforms import SubmitField, StringField, HiddenField, validators, TextAreaField
 
+# validators are stateless, so the forms share one instance of each
+_REQUIRED = validators.DataRequired()
+_LEN16 = validators.Length(min=16)
 
 class SearchForm(FlaskForm):
-    phrase = StringField('Phrase', [validators.DataRequired()])
+    phrase = StringField('Phrase', [_REQUIRED])
     submit = SubmitField('Go')
 
 class AddOnionForm(FlaskForm):
-    url = StringField("Onion Url", [validators.DataRequired(), validators.Length(min=16)])
-    captcha = StringField('captcha', validators=[validators.DataRequired()])
+    url = StringField("Onion Url", [_REQUIRED, _LEN16])
+    captcha = StringField('captcha', validators=[_REQUIRED])
     submit = SubmitField('+ add and scan service')
 
 
 class ReportOnionForm(FlaskForm):
     id = HiddenField()
     url = HiddenField()
-    captcha = StringField('captcha', validators=[validators.DataRequired()])
+    captcha = StringField('captcha', validators=[_REQUIRED])
     body = TextAreaField("Description")
     submit = SubmitField("report")
 
@@ -1,11 +1,13 @@
 import datetime
+import logging
 import re
+import zlib
 
 from bson.objectid import ObjectId
-from flask import request, redirect, url_for, flash, render_template, Response
-from pymongo import DESCENDING
+from flask import request, redirect, url_for, flash, render_template, Response, abort
+from pymongo.errors import OperationFailure
 from .. import captcha
-from .. import client
+from .. import documents
 
 from ..queues import crawler_q
 from ..config import *
@@ -14,12 +16,20 @@ from ..filters import *
 from .. import run_crawler
 from .forms import SearchForm, AddOnionForm, ReportOnionForm
 
-from ..paginate import Pagination
+from ..stats import onion_stats as oss
+from ..cache import ttl_cache
+from ..paginate import after_arg, seen_before
 from . import searchbp
 
 import time
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlparse, urlunparse
 
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(max_workers=4)
+
 @searchbp.route('/', methods=['GET', 'POST'])
 def index():
     # print (client.crawler.documents.find().count())
@@ -27,60 +37,94 @@ def index():
     if search_form.validate_on_submit():
         return redirect(url_for('.search', phrase=search_form.phrase.data.lower()))
     try:
-        alive_onions = client.crawler.documents.find({"status": 200}).count()
-        offline_checked_onions = client.crawler.documents.find({"status": 503}).count()
-        last_crawled = client.crawler.documents.find().sort("seen_time", DESCENDING).limit(1)
-        checked_onions = client.crawler.documents.find().count()
-        return render_template('index.html', form=search_form,
-                               checked_onions=checked_onions,
-                               alive_onions=alive_onions,
-                               offline_onions=offline_checked_onions,
-                               last_crawled=last_crawled[0]['seen_time'])
-
+        return render_template('index.html', form=search_form, **oss.get_index_stats())
     except:
-
+        logger.exception("index statistics failed")
         return render_template('index.html', form=search_form)
 
 
+MAX_SEARCH_COUNT = 10000  # stop counting regex matches past this
+
+
+@lru_cache(maxsize=1024)
+def _phrase_regex(phrase):
+    # escaped, so user input can't inject regex syntax into the mongo query
+    return re.compile(r"\b%s\b" % re.escape(phrase), re.IGNORECASE)
+
+
+def _search_query(phrase, text):
+    if text:
+        return {"$text": {"$search": phrase}}
+    return {"body": _phrase_regex(phrase)}
+
+
+@ttl_cache(60, maxsize=2048)
+def _search_count(phrase, text):
+    # every page of a result set shares one count
+    return documents.count_documents(_search_query(phrase, text), limit=MAX_SEARCH_COUNT)
+
+
+def _search_page(phrase, after, text):
+    # the count and the page are independent queries, so run them side by side
+    count = _executor.submit(_search_count, phrase, text)
+    results, next_after = seen_before(_search_query(phrase, text), after)
+    return results, next_after, count.result()
+
+
+@ttl_cache(300, maxsize=1024)
+def _cached_search(phrase, after):
+    # popular phrases repeat a lot; keep the page itself, not the cursor
+    try:
+        return _search_page(phrase, after, True)
+    except OperationFailure:
+        # no text index on this install, fall back to scanning the bodies
+        return _search_page(phrase, after, False)
+
+
 @searchbp.route('/search/<phrase>/', methods=["GET"])
-@searchbp.route('/search/<phrase>/<int:page_number>', methods=["GET"])
-def search(phrase, page_number=1):
+def search(phrase):
     # report_form = ReportOnionForm()
-    search_form = SearchForm()
-    regex = " %s " % phrase
+    after = after_arg()
     try:
-        all_count = client.crawler.documents.find({"body": re.compile(regex, re.IGNORECASE)}).count()
-        pagination = Pagination(page_number, n_per_page, all_count)
-        all = client.crawler.documents.find(
-            {"body": re.compile(regex, re.IGNORECASE)}
-        ).sort("seen_time", DESCENDING).skip(
-            (page_number - 1) * n_per_page).limit(n_per_page)
+        # the match is case-insensitive, so case variants share an entry
+        all, next_after, all_count = _cached_search(phrase.lower(), after)
     except:
-        return render_template('result.html',phrase=phrase, all_count=0,
-                               search_form=search_form)
+        return render_template('result.html',phrase=phrase, all_count=0)
 
     return render_template('result.html',
                            results=all,
-                           pagination=pagination,
-                           phrase=phrase, search_form=search_form,
-                           all_count=all_count)
+                           next_after=next_after,
+                           is_first=after is None,
+                           phrase=phrase,
+                           all_count=all_count,
+                           max_count=MAX_SEARCH_COUNT)
+
+@ttl_cache(300, maxsize=4096)
+def _report_url(id):
+    # the url of a page never changes, and reporters tend to reload the form
+    doc = documents.find_one({"_id": ObjectId(id)}, {"url": 1, "_id": 0})
+    return doc['url'] if doc else None
+
 
 @searchbp.route('/report/<string:id>', methods=["GET", "POST"])
 def report(id):
+    if not ObjectId.is_valid(id):
+        abort(404)
     report_form = ReportOnionForm()
-    search_form = SearchForm()
-    doc = None
+    url = None
     try:
-        doc = client.crawler.documents.find_one({"_id": ObjectId(id)})
-        report_form.url = doc['url']
+        url = _report_url(id)
+        report_form.url = url
         report_form.id = id
     except:
         flash("Invalid page")
         redirect(url_for('search.index'))
+    if url is None:
+        abort(404)
 
     if report_form.validate_on_submit():
         if captcha.validate():
-            client.crawler.documents.update_one({'_id': ObjectId(id)},
+            documents.update_one({'_id': ObjectId(id)},
                                                 {
                                                     '$push': {
                                                         'tags':
@@ -94,8 +138,8 @@ def report(id):
         else:
             flash("Wrong captcha", 'danger')
 
-    if doc['url']:
-        return render_template('report.html', search_form=search_form, report_form=report_form)
+    if url:
+        return render_template('report.html', report_form=report_form)
 
         # doc = client.crawler.documents.update_one({'_id': id}, {"$set": {"reported": 1,}})
 
@@ -103,7 +147,6 @@ def report(id):
 @searchbp.route('/new/', methods=['GET', 'POST'])
 def add_onion():
     add_form = AddOnionForm()
-    search_form = SearchForm()
 
     if add_form.validate_on_submit():
         if captcha.validate():
@@ -117,26 +160,24 @@ def add_onion():
             #     flash('This onion is already indexed', 'warning')
             #     return redirect(url_for("search.add_onion"))
 
-            print ("SEARCH BEFORE TRY")
             try:
 
                 # print (url)
                 parsed_url = urlparse(url)
                 if parsed_url.scheme == None or parsed_url.scheme == "":
                     url = "http://%s" % url
+                    parsed_url = urlparse(url)
+                # http://x.onion and http://x.onion/ are the same page
+                url = urlunparse(parsed_url._replace(path=parsed_url.path.rstrip('/')))
                 job = crawler_q.enqueue_call(
                     func=run_crawler, args=(url,), ttl=60, result_ttl=10
                 )
-                print (job)
                 if job.get_id():
-                    print (vars(job))
                     flash('New onion added to crawler queue.', 'success')
 
                 return redirect(url_for("index"))
             except Exception:
-                # print (Exception)
-                print ("ERROR")
-                # exit(0)
+                logger.exception("could not enqueue %s", url)
         else:
             flash("Captcha is not validate", 'danger')
             return redirect(url_for("search.add_onion"))
@@ -146,65 +187,80 @@ def add_onion():
         return redirect(url_for("search.add_onion"))
     # print (add_form.errors)
 
-    return render_template('new.html', add_form=add_form, search_form=search_form)
+    return render_template('new.html', add_form=add_form)
 
 
 
 @searchbp.route('/directory/', methods=["GET"])
-@searchbp.route('/directory/<int:page_number>', methods=["GET"])
-def directory(page_number=1):
-    search_form = SearchForm()
+def directory():
+    after = after_arg()
     try:
-        all_count = client.crawler.documents.find({'status':200}).count()
-        pagination = Pagination(page_number, n_per_page, all_count)
-        all = client.crawler.documents.find({'status':200}).sort("seen_time", DESCENDING).skip(
-            (page_number - 1) * n_per_page).limit(n_per_page)
+        all_count = oss.count_documents(status=200)
+        all, next_after = seen_before({'status': 200}, after)
     except:
-        print ("ERROR[?]")
+        logger.exception("directory query failed")
         return render_template('directory.html',
-                               search_form=search_form,
                                all_count=0)
 
     return render_template('directory.html',
                            results=all,
-                           pagination=pagination,
-                           search_form=search_form,
+                           next_after=next_after,
+                           is_first=after is None,
                            all_count=all_count)
 
 
 @searchbp.route('/directory/all', methods=["GET"])
-@searchbp.route('/directory/all/<int:page_number>', methods=["GET"])
-def directory_all(page_number=1):
-    search_form = SearchForm()
+def directory_all():
+    after = after_arg()
     try:
-        all_count = client.crawler.documents.find().count()
-        pagination = Pagination(page_number, n_per_page, all_count)
-        all = client.crawler.documents.find().sort("seen_time", DESCENDING).skip(
-            (page_number - 1) * n_per_page).limit(n_per_page)
+        all_count = oss.count_documents()
+        all, next_after = seen_before({}, after)
         is_all = True
     except:
         return render_template('directory.html',
-                               search_form=search_form,
                                all_count=0)
     return render_template('directory.html',
                            results=all,
-                           pagination=pagination,
-                           search_form=search_form,
+                           next_after=next_after,
+                           is_first=after is None,
                            all_count=all_count, is_all=is_all)
 
 
 @searchbp.route('/faq')
 def faq():
-    search_form = SearchForm()
-    return render_template('faq.html', search_form = search_form)
+    return render_template('faq.html')
+
+
+EXPORT_CHUNK_SIZE = 64 * 1024
 
 
 @searchbp.route('/export_all')
 def export_csv():
-    all = client.crawler.documents.find({'status': 200})
-    result = "# 200 OK status list\n "
-    for item in all:
-        result = str("%s%s\n" % (result, item['url']))
-    return Response(result, mimetype='text/plain')
+    def generate():
+        buf = bytearray(b"# 200 OK status list\n ")
+        for item in documents.find({'status': 200}, {'url': 1, '_id': 0}).batch_size(1000):
+            buf += item['url'].encode('utf8') + b"\n"
+            if len(buf) >= EXPORT_CHUNK_SIZE:
+                yield bytes(buf)
+                buf.clear()
+        if buf:
+            yield bytes(buf)
+
+    def gzipped(chunks):
+        # level 1 is nearly free on cpu and onion urls still shrink ~6x
+        z = zlib.compressobj(1, zlib.DEFLATED, 31)
+        for chunk in chunks:
+            data = z.compress(chunk)
+            if data:
+                yield data
+        yield z.flush()
+
+    # stream in 64 KiB chunks instead of building the whole list in memory
+    if 'gzip' in request.accept_encodings:
+        response = Response(gzipped(generate()), mimetype='text/plain')
+        response.headers['Content-Encoding'] = 'gzip'
+        response.vary.add('Accept-Encoding')
+        return response
+    return Response(generate(), mimetype='text/plain')
     # return render_template_string(result)
     # return render_template('faq.html', search_form = search_form)
@@ -1,94 +1,69 @@
-from .. import client
+from concurrent.futures import ThreadPoolExecutor
 
+from pymongo import DESCENDING
 
-def get_all_unique_page():
-    count = client.crawler.documents.distinct('url')
-    return count
-#
-# def get_requests_stats_series(from_date, to_date):
-#     # printto_date - from_date
-#
-#     import datetime
-#     delta_time = days_hours_minutes(to_date-from_date)
-#     # if delta_time[0] > 1:
-#     #     pipelines = []
-#     #     ctl_date = to_date - datetime.timedelta(days=7)
-#     #     if ctl_date - from_date > 0:
-#     #         # for days in range()
-#     #     pipelines.append(
-#     #         [
-#     #             {
-#     #                 "$match": {
-#     #                     "seen_time": {"$gt": from_date, "$lte": to_date}
-#     #                 },
-#     #             },
-#     #             {"$unwind": "$status"},
-#     #             {"$group": {"_id": "$status", "count": {"$sum": 1}}},
-#     #         ]
-#     #     )
-#
-#
-#     pipeline = [
-#         {
-#             "$match": {
-#                 "seen_time": { "$gt": from_date, "$lte": to_date }
-#             },
-#         },
-#         {"$unwind": "$status"},
-#         {"$group": {"_id": "$status", "count": {"$sum": 1}}},
-#     ]
-#
-#     counts = client.crawler.documents.aggregate(pipeline)
-#
-#     result = []
-#     for id in counts:
-#         result.append({'type':id['_id'], 'count': id['count']})
-#     return result
-#
+from .. import documents
+from ..cache import redis_memoize, ttl_cache
 
+_stats_pool = ThreadPoolExecutor(max_workers=4)
 
-def get_requests_stats(from_date, to_date):
+
+@ttl_cache(60)
+def count_documents(status=None, in_scope=None):
+    # totals barely move between page clicks, so reuse them for a minute
+    query = {}
+    if status is not None:
+        query['status'] = status
+    if in_scope is not None:
+        query['in_scope'] = in_scope
+    if not query:
+        # unfiltered totals come from collection metadata, no scan needed
+        return documents.estimated_document_count()
+    return documents.count_documents(query)
+
+
+RECENT_DOCUMENT_FIELDS = {"url": 1, "title": 1, "seen_time": 1, "parent": 1}
+
+
+@ttl_cache(10)
+def get_recent_documents(status=None, limit=20):
+    query = {} if status is None else {"status": status}
+    # no hint: the planner picks the seen_time indexes when they exist, and
+    # the query still works on an install that hasn't created them yet
+    # batch_size == limit keeps the driver from asking for a batch it won't use
+    return list(documents.find(query, RECENT_DOCUMENT_FIELDS)
+                .sort("seen_time", DESCENDING)
+                .batch_size(limit).limit(limit))
+
+
+@ttl_cache(60)
+def get_index_stats():
+    # landing page totals, shared by every hit for a minute; the three
+    # counts are independent, so a cold cache waits for the slowest only
+    checked = _stats_pool.submit(count_documents)
+    alive = _stats_pool.submit(count_documents, status=200)
+    offline = _stats_pool.submit(count_documents, status=503)
+    return {'checked_onions': checked.result(),
+            'alive_onions': alive.result(),
+            'offline_onions': offline.result()}
+
+
+@redis_memoize(60)
+def get_requests_stats(from_date, to_date, top_n=20):
     pipeline = [
         {
             "$match": {
                 "seen_time": { "$gte": from_date, "$lte": to_date }
             },
         },
-        {"$unwind": "$status"},
+        # only indexed fields past this point, so the scan can stay covered
+        {"$project": {"status": 1, "_id": 0}},
         {"$group": {"_id": "$status", "count": {"$sum": 1}}},
+        # only the most frequent statuses are charted
+        {"$sort": {"count": -1}},
+        {"$limit": top_n},
     ]
-    print (from_date)
-    print (to_date)
-    counts = client.crawler.documents.aggregate(pipeline)
-    # print (list(counts))
-    result = []
-    for id in counts:
-        result.append({'type':id['_id'], 'count': id['count']})
-
-    print (result)
-    return result
-
-
-# {"503": 1230, ... }
-def get_requests_stats_all():
-    pipeline = [
-        {"$unwind": "$status"},
-        {"$group": {"_id": "$status", "count":{"$sum": 1}}},
-    ]
-    counts = client.crawler.documents.aggregate(pipeline)
-
-    # counts = client.crawler.documents.aggregate(pipeline)
-    #
-    # label = []
-    # count = []
-    # for id in counts:
-    #     label.append(id['_id'])
-    #     count.append(id['count'])
-
-
-    result = []
-    for id in counts:
-        result.append({'type':id['_id'], 'count': id['count']})
+    # unhinted, so a missing seen_time/status index slows this down instead of failing it
+    counts = documents.aggregate(pipeline, allowDiskUse=False, batchSize=1000)
+    return [{'type': d['_id'], 'count': d['count']} for d in counts]
 
-    # print (result)
-    return result